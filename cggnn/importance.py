@@ -6,16 +6,17 @@ As used in:
     Jaume et al, CVPR, 2021.
 """
 
-from typing import List, Optional, Dict, Tuple, DefaultDict
+from typing import List, Optional, Dict, Type
 
 from tqdm import tqdm
-from numpy import average
+from numpy import bincount, concatenate, repeat, unique
 from torch import FloatTensor
 from torch.cuda import is_available
 from dgl import DGLGraph
 from pandas import Series
 
 from cggnn.util import CellGraphModel, set_seeds
+from cggnn.util.util import torch_to_numpy
 from cggnn.util.constants import IMPORTANCES, INDICES
 from cggnn.util.interpretability import (BaseExplainer, GraphLRPExplainer, GraphGradCAMExplainer,
                                          GraphGradCAMPPExplainer, GraphPruningExplainer)
@@ -23,6 +24,20 @@ from cggnn.train import infer_with_model
 
 IS_CUDA = is_available()
 DEVICE = 'cuda:0' if IS_CUDA else 'cpu'
+EXPLAINERS: Dict[str, Type[BaseExplainer]] = {
+    'lrp': GraphLRPExplainer,
+    'graphlrpexplainer': GraphLRPExplainer,
+    'cam': GraphGradCAMExplainer,
+    'gradcam': GraphGradCAMExplainer,
+    'graphgradcamexplainer': GraphGradCAMExplainer,
+    'pp': GraphGradCAMPPExplainer,
+    'campp': GraphGradCAMPPExplainer,
+    'gradcampp': GraphGradCAMPPExplainer,
+    'graphgradcamppexplainer': GraphGradCAMPPExplainer,
+    'pruning': GraphPruningExplainer,
+    'gnn': GraphPruningExplainer,
+    'graphpruningexplainer': GraphPruningExplainer,
+}
 
 
 def calculate_importance(cell_graphs: List[DGLGraph],
@@ -31,18 +46,10 @@ def calculate_importance(cell_graphs: List[DGLGraph],
                          random_seed: Optional[int] = None
                          ) -> List[DGLGraph]:
     """Calculate the importance for all cells in every graph."""
-    explainer: BaseExplainer
-    explainer_model = explainer_model.lower().strip()
-    if explainer_model in {'lrp', 'graphlrpexplainer'}:
-        explainer = GraphLRPExplainer(model=model)
-    elif explainer_model in {'cam', 'gradcam', 'graphgradcamexplainer'}:
-        explainer = GraphGradCAMExplainer(model=model)
-    elif explainer_model in {'pp', 'campp', 'gradcampp', 'graphgradcamppexplainer'}:
-        explainer = GraphGradCAMPPExplainer(model=model)
-    elif explainer_model in {'pruning', 'gnn', 'graphpruningexplainer'}:
-        explainer = GraphPruningExplainer(model=model)
-    else:
+    explainer_class = EXPLAINERS.get(explainer_model.lower().strip())
+    if explainer_class is None:
         raise ValueError("explainer_model not recognized.")
+    explainer: BaseExplainer = explainer_class(model=model)
 
     if random_seed is not None:
         set_seeds(random_seed)
@@ -65,6 +72,7 @@ def calculate_importance(cell_graphs: List[DGLGraph],
 
 def unify_importance_across(graphs_by_specimen: List[List[DGLGraph]],
                             model: CellGraphModel,
+                            batch_size: int = 1,
                             random_seed: Optional[int] = None
                             ) -> Dict[int, float]:
     """Merge importance values for all cells in all ROIs in all specimens."""
@@ -72,7 +80,7 @@ def unify_importance_across(graphs_by_specimen: List[List[DGLGraph]],
         set_seeds(random_seed)
     hs_id_to_importance: Dict[int, float] = {}
     for graphs in graphs_by_specimen:
-        for hs_id, importance in _unify_importance(graphs, model).items():
+        for hs_id, importance in _unify_importance(graphs, model, batch_size).items():
             if hs_id in hs_id_to_importance:
                 raise RuntimeError(
                     'The same histological structure ID appears in multiple specimens.')
@@ -80,23 +88,25 @@ def unify_importance_across(graphs_by_specimen: List[List[DGLGraph]],
     return hs_id_to_importance
 
 
-def _unify_importance(graphs: List[DGLGraph], model: CellGraphModel) -> Dict[int, float]:
+def _unify_importance(graphs: List[DGLGraph],
+                      model: CellGraphModel,
+                      batch_size: int = 1
+                      ) -> Dict[int, float]:
     """Merge the importance values for each cell in a specimen."""
-    probs = infer_with_model(model, graphs, return_probability=True)
-    hs_id_to_importances: Dict[int, List[Tuple[float, float]]] = DefaultDict(list)
-    for i_graph, graph in enumerate(graphs):
-        for i in range(graph.num_nodes()):
-            hs_id_to_importances[graph.ndata[INDICES][i].item()].append(
-                (graph.ndata[IMPORTANCES][i], max(probs[i_graph, ])))
-    hs_id_to_importance: Dict[int, float] = {}
-    for hs_id, importance_confidences in hs_id_to_importances.items():
-        hs_id_to_importance[hs_id] = average([ic[0] for ic in importance_confidences],
-                                             weights=[ic[1] for ic in importance_confidences])
-    return hs_id_to_importance
+    probs = infer_with_model(model, graphs, in_ram=False, batch_size=batch_size,
+                             return_probability=True)
+    hs_ids = concatenate([torch_to_numpy(graph.ndata[INDICES]) for graph in graphs])
+    importances = concatenate([torch_to_numpy(graph.ndata[IMPORTANCES]) for graph in graphs])
+    confidences = repeat(probs.max(axis=1), [graph.num_nodes() for graph in graphs])
+    unique_ids, positions = unique(hs_ids, return_inverse=True)
+    weighted_importances = bincount(positions, weights=importances * confidences) \
+        / bincount(positions, weights=confidences)
+    return {int(hs_id): importance
+            for hs_id, importance in zip(unique_ids, weighted_importances)}
 
 
 def save_importances(hs_id_to_importance: Dict[int, float], out_directory: str) -> None:
     """Save importance scores per histological structure to CSV."""
     s = Series(hs_id_to_importance).sort_index()
     s.name = 'importance'
-    s.to_csv(out_directory)
+    s.to_csv(out_directory, chunksize=10000)
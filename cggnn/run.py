@@ -1,9 +1,9 @@
 """Functions that run key pipelines of the cggnn model."""
 
-from typing import Dict, List, DefaultDict, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
 from os.path import join
 
-from pandas import DataFrame
+from pandas import DataFrame, Series
 from dgl import DGLGraph  # type: ignore
 
 from cggnn import train, calculate_importance, unify_importance_across, save_importances, \
@@ -41,12 +41,14 @@ def train_and_evaluate(cg_directory: str,
         graphs_data = [d._replace(graph=graph) for d, graph in zip(graphs_data, cell_graphs)]
         save_cell_graphs(graphs_data, cg_directory)
         if merge_rois:
-            cell_graphs_by_specimen: Dict[str, List[DGLGraph]] = DefaultDict(list)
-            for cg in graphs_data:
-                cell_graphs_by_specimen[cg.specimen].append(cg.graph)
+            cell_graphs_by_specimen: Dict[str, List[DGLGraph]] = Series(
+                [cg.graph for cg in graphs_data],
+                dtype=object,
+            ).groupby([cg.specimen for cg in graphs_data]).apply(list).to_dict()
             hs_id_to_importance = unify_importance_across(
                 list(cell_graphs_by_specimen.values()),
                 model,
+                batch_size=batch_size,
                 random_seed=random_seed)
             save_importances(hs_id_to_importance, join(cg_directory, 'importances.csv'))
     return model, graphs_data, hs_id_to_importance
@@ -57,6 +59,7 @@ def find_separability(cg_path: str,
                       label_to_result_path: Optional[str] = None,
                       prune_misclassified: bool = False,
                       output_directory: Optional[str] = None,
+                      batch_size: int = 1,
                       random_seed: Optional[int] = None,
                       ) -> Tuple[DataFrame,
                                  DataFrame,
@@ -71,6 +74,7 @@ def find_separability(cg_path: str,
         if label_to_result_path else None,
         prune_misclassified=prune_misclassified,
         out_directory=output_directory,
+        batch_size=batch_size,
         random_seed=random_seed)
     print(df_concept)
     print(df_aggregated)
@@ -46,6 +46,14 @@ def parse_arguments():
         default=None,
         required=False
     )
+    parser.add_argument(
+        '-b',
+        '--batch_size',
+        type=int,
+        help='Batch size to use when running model inference.',
+        default=1,
+        required=False
+    )
     parser.add_argument(
         '--random_seed',
         type=int,
@@ -63,4 +71,5 @@ if __name__ == "__main__":
                       args.label_to_result_path,
                       args.prune_misclassified,
                       args.output_directory,
+                      args.batch_size,
                       args.random_seed)
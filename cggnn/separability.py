@@ -16,8 +16,9 @@ from torch.cuda import is_available
 from dgl import DGLGraph
 from sklearn.preprocessing import minmax_scale
 from sklearn.metrics import auc
-from numpy import (empty, argsort, array, max, concatenate, reshape, histogram, corrcoef, mean,
-                   ones, all, unique, sort, inf)
+from numpy import (empty, argpartition, arange, array, bincount, clip, float32, linspace, max,
+                   concatenate, reshape, histogram, corrcoef, mean, ones, all, searchsorted,
+                   unique, sort, inf)
 from numpy.typing import NDArray
 from scipy.stats import wasserstein_distance
 from scipy.ndimage.filters import uniform_filter1d
@@ -27,6 +28,7 @@ from matplotlib.pyplot import plot, title, savefig, legend, clf
 from cggnn.util import GraphData
 from cggnn.util.constants import FEATURES, IMPORTANCES
 from cggnn.util import CellGraphModel
+from cggnn.util.util import torch_to_numpy
 from cggnn.train import infer_with_model
 
 
@@ -43,25 +45,24 @@ def calculate_separability(graphs_data: List[GraphData],
                            risk: Optional[NDArray[Any]] = None,
                            pathological_prior: Optional[NDArray[Any]] = None,
                            out_directory: Optional[str] = None,
+                           batch_size: int = 1,
                            random_seed: Optional[int] = None
                            ) -> Tuple[DataFrame, DataFrame,
                                       Dict[Union[Tuple[int, int], Tuple[str, str]], DataFrame]]:
     """Generate separability scores for each concept."""
     # Get the importance scores, labels, and features from all cell graphs
-    graphs: List[DGLGraph] = []
     importance_scores: List[NDArray] = []
     labels: List[int] = []
     features: List[NDArray] = []
     for g in graphs_data:
         if g.label is not None:
-            graphs.append(g.graph)
-            importance_scores.append(g.graph.ndata[IMPORTANCES])
+            importance_scores.append(torch_to_numpy(g.graph.ndata[IMPORTANCES]))
             labels.append(g.label)
-            features.append(g.graph.ndata[FEATURES])
+            features.append(torch_to_numpy(g.graph.ndata[FEATURES]))
     assert features[0].shape[1] == len(feature_names)
 
     classes = sort(unique(labels)).tolist()
-    if max(labels) + 1 != len(classes):
+    if classes[-1] + 1 != len(classes):
         raise ValueError('Class missing from assigned labels. Ensure that your labels are '
                          'zero-indexed and that at least one example from every class is present '
                          'in your dataset.')
@@ -73,16 +74,14 @@ def calculate_separability(graphs_data: List[GraphData],
         assert len(risk) == len(classes)
 
     if prune_misclassified:
-        mask = _misclassified([g.graph for g in graphs_data], labels, model, random_seed)
+        mask = _misclassified([g.graph for g in graphs_data if g.label is not None],
+                              labels, model, batch_size, random_seed)
         importance_scores = list(compress(importance_scores, mask))
         features = list(compress(features, mask))
         labels = list(compress(labels, mask))
 
     # Compute separability scores
-    least_cells = features[0].shape[0]
-    for graph_attribute in features:
-        if graph_attribute.shape[0] < least_cells:
-            least_cells = graph_attribute.shape[0]
+    least_cells = min(graph_attribute.shape[0] for graph_attribute in features)
     separability_calculator = AttributeSeparability(
         classes, list(range(1, least_cells, max((1, round(least_cells/100))))))
     separability_scores, all_histograms, k_max_dist = separability_calculator.process(
@@ -96,9 +95,9 @@ def calculate_separability(graphs_data: List[GraphData],
     if out_directory is not None:
         out_directory = join(out_directory, 'separability')
         makedirs(out_directory, exist_ok=True)
+        k_to_plot = 25 if 25 in all_histograms else max(tuple(all_histograms.keys()))
         for i, attribute_name in enumerate(feature_names):
-            _plot_histogram(all_histograms, out_directory, i, attribute_name,
-                            k=25 if 25 in all_histograms else max(tuple(all_histograms.keys())))
+            _plot_histogram(all_histograms, out_directory, i, attribute_name, k=k_to_plot)
 
     # Compute final qualitative metrics
     if concept_grouping is None:
@@ -156,6 +155,7 @@ class AttributeSeparability:
         """
         self.keep_nuclei_list = keep_nuclei
         self.n_keep_nuclei = len(self.keep_nuclei_list)
+        self.normalized_keep_nuclei = array(self.keep_nuclei_list) / max(self.keep_nuclei_list)
         self.classes = classes
         self.n_classes = len(self.classes)
         self.class_pairs = list(combinations(self.classes, 2))
@@ -201,20 +201,14 @@ class AttributeSeparability:
             for attr_id in range(n_attrs):
                 attr_name = feature_names[attr_id]
                 all_aucs[self.class_pairs[class_pair_id]][attr_name] = auc(
-                    array(self.keep_nuclei_list) /
-                    max(self.keep_nuclei_list),
+                    self.normalized_keep_nuclei,
                     all_distances[:, class_pair_id, attr_id]
                 )
 
-                k_max = self.keep_nuclei_list[0]
-                max_dist = all_distances[k_max, class_pair_id, attr_id]
-                for i, k in enumerate(self.keep_nuclei_list):
-                    dist = all_distances[i, class_pair_id, attr_id]
-                    if dist > max_dist:
-                        k_max = k
-                        max_dist = dist
-                k_max_dist[self.class_pairs[class_pair_id]
-                           ][attr_id] = (k_max, max_dist)
+                attr_distances = all_distances[:, class_pair_id, attr_id]
+                i_max = int(attr_distances.argmax())
+                k_max_dist[self.class_pairs[class_pair_id]][attr_id] = \
+                    (self.keep_nuclei_list[i_max], attr_distances[i_max])
 
         return all_aucs, all_histograms, k_max_dist
 
@@ -231,17 +225,15 @@ class AttributeSeparability:
         """
         all_distances = empty(
             (self.n_keep_nuclei, self.n_class_pairs, n_attr))
+        if self.n_class_pairs == 0:
+            return all_distances
         for k_id, k in enumerate(self.keep_nuclei_list):
-            omega = 0
-            for tx in range(self.n_classes):
-                for ty in range(self.n_classes):
-                    if tx < ty:
-                        for attr_id in range(n_attr):
-                            all_distances[k_id, omega, attr_id] = wasserstein_distance(
-                                all_histograms[k][tx][attr_id],
-                                all_histograms[k][ty][attr_id]
-                            )
-                        omega += 1
+            for pair_id, (tx, ty) in enumerate(self.class_pairs):
+                for attr_id in range(n_attr):
+                    all_distances[k_id, pair_id, attr_id] = wasserstein_distance(
+                        all_histograms[k][tx][attr_id],
+                        all_histograms[k][ty][attr_id]
+                    )
         return all_distances
 
     def _compute_attr_histograms(
@@ -264,32 +256,29 @@ class AttributeSeparability:
                                                             attributes (as np array).
         """
         all_histograms: Dict[int, Dict[int, NDArray]] = {}
+        labels = array(label_list)
         for k in self.keep_nuclei_list:
             all_histograms[k] = {}
 
-            attrs = [c[argsort(s)[-k:]]
+            attrs = [c[argpartition(s, -k)[-k:]]
                      for c, s in zip(attribute_list, importance_list)]
-            attrs = concatenate(attrs, axis=0)  # (#samples x k) x #attrs
+            attrs = concatenate(attrs, axis=0).astype(float32, copy=False)
+            # (#samples x k) x #attrs
             attrs[attrs == inf] = 0  # ensure no weird values in attributes
             attrs = minmax_scale(attrs)
             # #samples x k x #attrs
             attrs = reshape(attrs, (-1, k, n_attrs))
-            attrs = list(attrs)
 
             for t in range(self.n_classes):
 
                 # i. extract the samples of type t
-                selected_attrs = [a for l, a in zip(
-                    label_list, attrs) if l == t]
-                if len(selected_attrs) == 0:
+                selected_attrs = attrs[labels == t]
+                if selected_attrs.shape[0] == 0:
                     raise RuntimeError(f'Missing samples of class {t}')
-                selected_attrs = concatenate(selected_attrs, axis=0)
+                selected_attrs = selected_attrs.reshape(-1, n_attrs)
 
                 # iii. build the histogram for all the attrs (dim = #nuclei x attr_types)
-                all_histograms[k][t] = array(
-                    [self.build_hist(selected_attrs[:, attr_id])
-                     for attr_id in range(selected_attrs.shape[1])]
-                )
+                all_histograms[k][t] = self.build_hists(selected_attrs)
         return all_histograms
 
     @staticmethod
@@ -318,6 +307,27 @@ class AttributeSeparability:
             concept_values, bins=num_bins, range=(0., 1.), density=True)
         return hist
 
+    @staticmethod
+    def build_hists(concept_values: NDArray, num_bins: int = 100) -> NDArray:
+        """Build 1D histograms for every concept at once.
+
+        Equivalent to stacking build_hist over the columns of concept_values, but bins every
+        concept with a single C-level bincount call instead of one histogram call per concept.
+
+        Args:
+            concept_values (NDArray): Nuclei-level values, dim = #nuclei x #concepts.
+            num_bins (int): Number of bins in each histogram. Default to 100.
+        Returns:
+            hists (NDArray): Histograms, dim = #concepts x num_bins.
+        """
+        n_samples, n_attrs = concept_values.shape
+        edges = linspace(0., 1., num_bins + 1)
+        bin_ids = searchsorted(edges, concept_values, side='right') - 1
+        clip(bin_ids, 0, num_bins - 1, out=bin_ids)
+        bin_ids += arange(n_attrs) * num_bins
+        counts = bincount(bin_ids.ravel(), minlength=n_attrs * num_bins)
+        return counts.reshape(n_attrs, num_bins) * (num_bins / n_samples)
+
 
 class SeparabilityAggregator:
     """Aggregation of separability metrics."""
@@ -429,7 +439,7 @@ def _plot_histogram(all_histograms: Dict[int, Dict[int, NDArray]],
                     k: int = 25,
                     smoothing: bool = True) -> None:
     """Create histogram for a single attribute."""
-    x = array(list(range(100)))
+    x = arange(100)
     for i, histogram in all_histograms[k].items():
         plot(x, uniform_filter1d(
             histogram[attr_id], size=5) if smoothing else histogram[attr_id], label=f'Class {i}')
@@ -443,11 +453,14 @@ def _plot_histogram(all_histograms: Dict[int, Dict[int, NDArray]],
 def _misclassified(cell_graphs: List[DGLGraph],
                    cell_graph_labels: List[int],
                    model: CellGraphModel,
+                   batch_size: int = 1,
                    random_seed: Optional[int] = None
                    ) -> List[bool]:
     """Identify which samples are misclassified."""
     return (array(cell_graph_labels) == infer_with_model(model,
                                                          cell_graphs,
+                                                         in_ram=False,
+                                                         batch_size=batch_size,
                                                          random_seed=random_seed)).tolist()
 
 
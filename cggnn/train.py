@@ -4,7 +4,7 @@ from os import makedirs, listdir
 from os.path import exists, join
 from typing import Callable, List, Tuple, Optional, Any, Dict
 
-from numpy import array
+from numpy import array, zeros
 from numpy.typing import NDArray
 from torch import save, load, no_grad, argmax, cat  # type: ignore
 from torch.cuda import is_available
@@ -12,7 +12,8 @@ from torch.optim import Adam, Optimizer
 from torch.nn import CrossEntropyLoss
 from torch.nn.functional import softmax
 from torch.utils.data import DataLoader
-from sklearn.metrics import accuracy_score, f1_score, classification_report  # type: ignore
+from sklearn.metrics import accuracy_score, f1_score, classification_report, \
+    confusion_matrix  # type: ignore
 from dgl import DGLGraph
 from tqdm import tqdm
 
@@ -60,6 +61,7 @@ def train(graphs_data: List[GraphData],
     loss_fn = CrossEntropyLoss()
 
     # training loop
+    model = model.to(DEVICE)
     step: int = 0
     best_validation_loss: float = 10e5
     best_validation_accuracy: float = 0.
@@ -76,7 +78,6 @@ def train(graphs_data: List[GraphData],
                 train_ids, test_ids, train_dataset, validation_dataset, batch_size)
 
             # A.) train for 1 epoch
-            model = model.to(DEVICE)
             model, step = _train_step(
                 model, train_dataloader, loss_fn, optimizer, epoch, fold, step)
 
@@ -133,6 +134,19 @@ def _train_step(model: CellGraphModel,
     return model, step
 
 
+def _accuracy_and_weighted_f1(labels: NDArray, predictions: NDArray) -> Tuple[float, float]:
+    """Compute accuracy and weighted F1 score from a single confusion matrix."""
+    cm = confusion_matrix(labels, predictions)
+    true_positives = cm.diagonal()
+    support = cm.sum(axis=1)
+    denominator = support + cm.sum(axis=0)  # 2*TP + FP + FN per class
+    f1_scores = zeros(len(true_positives))
+    nonzero = denominator > 0
+    f1_scores[nonzero] = 2 * true_positives[nonzero] / denominator[nonzero]
+    accuracy = true_positives.sum() / cm.sum()
+    return float(accuracy), float((f1_scores * support).sum() / support.sum())
+
+
 def _validation_step(model: CellGraphModel,
                      validation_dataloader: DataLoader,
                      loss_fn: Callable,
@@ -171,14 +185,13 @@ def _validation_step(model: CellGraphModel,
     # compute & store accuracy + model
     all_validation_predictions = all_validation_predictions.detach().numpy()
     all_validation_labels = all_validation_labels.detach().numpy()
-    accuracy = accuracy_score(all_validation_labels, all_validation_predictions)
+    accuracy, weighted_f1_score = _accuracy_and_weighted_f1(
+        all_validation_labels, all_validation_predictions)
     if accuracy > best_validation_accuracy:
         best_validation_accuracy = accuracy
         save(model.state_dict(), join(model_path, 'model_best_validation_accuracy.pt'))
 
     # compute & store weighted f1-score + model
-    weighted_f1_score = f1_score(
-        all_validation_labels, all_validation_predictions, average='weighted')
     if weighted_f1_score > best_validation_weighted_f1_score:
         best_validation_weighted_f1_score = weighted_f1_score
         save(model.state_dict(), join(model_path, 'model_best_validation_weighted_f1_score.pt'))
@@ -207,13 +220,14 @@ def _test_model(model: CellGraphModel,
 
     max_acc = -1.
     max_acc_model_checkpoint = {}
+    checkpoint_names = [f for f in listdir(model_path) if f.endswith(".pt")]
 
     for metric in ['best_validation_loss', 'best_validation_accuracy',
                    'best_validation_weighted_f1_score']:
 
         print(f'\n*** Start testing w/ {metric} model ***')
 
-        model_name = [f for f in listdir(model_path) if f.endswith(".pt") and metric in f][0]
+        model_name = [f for f in checkpoint_names if metric in f][0]
         checkpoint = load(join(model_path, model_name))
         model.load_state_dict(checkpoint)
 
@@ -235,17 +249,14 @@ def _test_model(model: CellGraphModel,
         with no_grad():
             loss = loss_fn(all_test_logits, all_test_labels).item()
 
-        # compute & store accuracy
+        # compute & store accuracy and weighted f1-score
         all_test_preds = all_test_preds.detach().numpy()
         all_test_labels = all_test_labels.detach().numpy()
-        accuracy = accuracy_score(all_test_labels, all_test_preds)
+        accuracy, weighted_f1_score = _accuracy_and_weighted_f1(all_test_labels, all_test_preds)
         if accuracy > max_acc:
             max_acc = accuracy
             max_acc_model_checkpoint = checkpoint
 
-        # compute & store weighted f1-score
-        weighted_f1_score = f1_score(all_test_labels, all_test_preds, average='weighted')
-
         # compute and store classification report
         report = classification_report(all_test_labels, all_test_preds, digits=4)
         out_path = join(model_path, 'classification_report.txt')
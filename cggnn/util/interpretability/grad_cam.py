@@ -288,7 +288,7 @@ class BaseGraphGradCAMExplainer(BaseExplainer):
         for class_idx in classes:
             node_importance = self.extractor(
                 class_idx, original_logits, normalized=True
-            ).cpu()
+            )
             all_class_importances.append(node_importance)
             self.extractor.clear_hooks()
         logits = original_logits.cpu().detach().numpy()
@@ -179,7 +179,7 @@ class GraphPruningExplainer(BaseExplainer):
 
             # Compute number of non zero elements in the masked adjacency
             node_importance = explainer._get_node_feats_mask()
-            node_importance[node_importance < self.node_thresh] = 0.
+            node_importance = node_importance * (node_importance >= self.node_thresh)
             masked_feats = masked_feats * \
                 torch.stack(
                     masked_feats.shape[-1] * [node_importance], dim=1).unsqueeze(dim=0).to(torch.float)
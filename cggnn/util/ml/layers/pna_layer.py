@@ -4,7 +4,6 @@ Gabriele Corso, Luca Cavalleri, Dominique Beaini, Pietro Lio, Petar Velickovic
     https://arxiv.org/abs/2004.05718
 """
 
-import itertools
 import math
 import numpy as np
 import torch
@@ -224,8 +223,8 @@ class PNATower(nn.Module):
                 num_nodes = g.batch_num_nodes()
             else:
                 num_nodes = [g.number_of_nodes()]
-            snorm_n = torch.FloatTensor(list(itertools.chain(
-                *[[torch.sqrt(1 / n)] * n for n in num_nodes]))).to(h.device)
+            counts = torch.as_tensor(num_nodes, device=h.device)
+            snorm_n = torch.repeat_interleave(torch.rsqrt(counts.to(h.dtype)), counts)
             h = h * snorm_n[:, None]
         if self.batch_norm:
             h = self.batchnorm_h(h)
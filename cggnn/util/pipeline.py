@@ -181,11 +181,16 @@ class PipelineStep(ABC):
         if not isinstance(outputs, tuple):
             outputs = tuple([outputs])
         for i, output in enumerate(outputs):
+            if getattr(output, "nbytes", 0) > 4096:
+                compression_options = {"compression": "gzip", "compression_opts": 9}
+            else:
+                # Gzip on scalar-sized outputs costs more CPU than the bytes it saves and
+                # forces chunked storage; store them contiguously instead.
+                compression_options = {}
             output_file.create_dataset(
                 f"{self.output_key}_{i}",
                 data=output,
-                compression="gzip",
-                compression_opts=9,
+                **compression_options,
             )
 
     def _process_and_save(
@@ -349,6 +354,11 @@ class PipelineRunner:
         return {k: variables[k] for k in self.outputs}
 
 
+# Pipeline held by each worker process so that fork-based pool workers construct their
+# pipeline once instead of once per datapoint.
+_worker_pipeline: Optional[PipelineRunner] = None
+
+
 class BatchPipelineRunner:
     """Batch pipeline runner, for multiple inputs with multiprocessing support."""
 
@@ -391,14 +401,17 @@ class BatchPipelineRunner:
             data (Tuple[Any, pd.core.series.Series]): The index and row of the dataframe,
                                                       as returned from df.iterrows()
         """
+        global _worker_pipeline
+
         # Disable multiprocessing
         os.environ["OPENBLAS_NUM_THREADS"] = "1"
         os.environ["MKL_NUM_THREADS"] = "1"
         os.environ["OMP_NUM_THREADS"] = "1"
 
         name, row = data
-        pipeline = self._build_pipeline_runner()
-        pipeline.run(output_name=name, **row)
+        if _worker_pipeline is None:
+            _worker_pipeline = self._build_pipeline_runner()
+        _worker_pipeline.run(output_name=name, **row)
 
     def link_output(self, link_directory: str) -> None:
         """Create a symlink between the output directory of the pipeline and the provided path.
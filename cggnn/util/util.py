@@ -165,6 +165,10 @@ class CGDataset(Dataset):
         self.cell_graph_labels = cell_graph_labels
         self.n_cell_graphs = len(self.cell_graphs)
         self.load_in_ram = load_in_ram
+        if IS_CUDA and load_in_ram:
+            # Graphs held in RAM are reused every epoch, so transfer them to the GPU once
+            # here rather than on every fetch.
+            self.cell_graphs = [graph.to('cuda:0') for graph in self.cell_graphs]
 
     def __getitem__(self, index: int) -> DGLGraph | tuple[DGLGraph, float]:
         """Get an example.
@@ -173,7 +177,7 @@ class CGDataset(Dataset):
             index (int): index of the example.
         """
         cell_graph = self.cell_graphs[index]
-        if IS_CUDA:
+        if IS_CUDA and not self.load_in_ram:
             cell_graph = cell_graph.to('cuda:0')
         return cell_graph if (self.cell_graph_labels is None) \
             else (cell_graph, float(self.cell_graph_labels[index]))
@@ -190,9 +194,9 @@ def create_datasets(
 ) -> tuple[CGDataset, CGDataset | None, CGDataset | None, KFold | None]:
     """Make the cell and/or tissue graph datasets and the k-fold if necessary."""
     cell_graph_sets = split_graph_sets(graphs_data)
-    train_dataset: CGDataset | None = \
-        create_dataset(cell_graph_sets[0][0], cell_graph_sets[0][1], in_ram)
-    assert train_dataset is not None
+    if len(cell_graph_sets[0][0]) == 0:
+        raise ValueError('No labeled training graphs were provided.')
+    train_dataset = CGDataset(cell_graph_sets[0][0], cell_graph_sets[0][1], load_in_ram=in_ram)
     validation_dataset = create_dataset(cell_graph_sets[1][0], cell_graph_sets[1][1], in_ram)
     test_dataset = create_dataset(cell_graph_sets[2][0], cell_graph_sets[2][1], in_ram)
 
@@ -296,15 +300,16 @@ def split_graph_sets(graphs_data: list[GraphData]) -> tuple[
     cg_val: tuple[list[DGLGraph], list[int]] = ([], [])
     cg_test: tuple[list[DGLGraph], list[int]] = ([], [])
     cg_unlabeled: list[DGLGraph] = []
+    sets_by_name: dict[SETS_type | None, tuple[list[DGLGraph], list[int]]] = {
+        'train': cg_train,
+        'validation': cg_val,
+        'test': cg_test,
+    }
     for gd in graphs_data:
         if gd.label is None:
             cg_unlabeled.append(gd.graph)
             continue
-        which_set: tuple[list[DGLGraph], list[int]] = cg_train
-        if gd.set == 'validation':
-            which_set = cg_val
-        elif gd.set == 'test':
-            which_set = cg_test
+        which_set = sets_by_name.get(gd.set, cg_train)
         which_set[0].append(gd.graph)
         which_set[1].append(gd.label)
     return cg_train, cg_val, cg_test, cg_unlabeled